@@ -9,18 +9,32 @@ from datetime import datetime
 # Configuração da página
 st.set_page_config(page_title="Análise Curva ABC", layout="wide")
 
-def carregar_dados(uploaded_file):
-    """Carrega e prepara os dados da planilha"""
+# Classes ABC e cores usadas no gráfico de Pareto (mesma ordem)
+CLASSES = ['A', 'B', 'C']
+CORES_CLASSES = np.array(['blue', 'orange', 'green'])
+
+# Troca os separadores do formato americano (1,234.56) pelos do brasileiro (1.234,56)
+TABELA_SEPARADORES = str.maketrans(',.', '.,')
+
+# Limites do percentual acumulado para as classes A (até 80%) e B (até 95%)
+LIMITES_CLASSES = [80, 95]
+
+# Colunas auxiliares que não são exibidas nem exportadas
+COLUNAS_INTERNAS = ['_COLOR']
+
+@st.cache_data(show_spinner=False)
+def carregar_dados(file_bytes, file_name):
+    """Carrega e prepara os dados da planilha (cacheado pelo conteúdo do arquivo)"""
     try:
         # Verifica a extensão do arquivo
-        file_extension = uploaded_file.name.split('.')[-1].lower()
+        file_extension = file_name.split('.')[-1].lower()
         
         if file_extension == 'csv':
-            df = pd.read_csv(uploaded_file)
+            df = pd.read_csv(io.BytesIO(file_bytes))
         elif file_extension in ['xlsx', 'xlsm']:
             # Ler especificamente as colunas B até I, começando da linha 11
             df = pd.read_excel(
-                uploaded_file,
+                io.BytesIO(file_bytes),
                 sheet_name='ANALISE',
                 usecols='B:I',  # Específica as colunas B até I
                 skiprows=10,    # Pula as primeiras 10 linhas
@@ -68,43 +82,75 @@ def formatar_moeda_real(valor):
         # Converte para float caso não seja
         valor = float(valor)
         # Formata com R$, separador de milhares e 2 casas decimais
-        return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+        return f"R$ {valor:,.2f}".translate(TABELA_SEPARADORES)
     except:
         return "R$ 0,00"
 
+def formatar_moeda_vetor(valores):
+    """Formata um array de valores para R$ com separadores de milhares"""
+    return [f"R$ {valor:,.2f}".translate(TABELA_SEPARADORES) for valor in valores.tolist()]
+
+@st.cache_resource(show_spinner=False)
 def processar_dados(df):
-    """Processa os dados para análise ABC"""
+    """Processa os dados para análise ABC
+    
+    Retorna o DataFrame processado e o array de descrições em minúsculas usado
+    pela busca. O resultado fica em cache sem ser copiado a cada execução do
+    script, por isso deve ser tratado como somente leitura.
+    """
     try:
-        # Criar cópia do DataFrame
-        df_processado = df.copy()
+        # O st.cache_data de carregar_dados já entrega uma cópia, não é preciso copiá-lo
+        df_processado = df
         
         # Limpar e converter a coluna TOTAL
         df_processado['TOTAL'] = df_processado['TOTAL'].apply(limpar_valor_monetario)
         
-        # Remover linhas com total zero ou nulo
-        df_processado = df_processado[df_processado['TOTAL'] > 0].reset_index(drop=True)
+        # Remover linhas com total zero ou nulo e ordenar por valor total,
+        # reindexando o DataFrame uma única vez
+        totais = df_processado['TOTAL'].to_numpy()
+        positivos = np.flatnonzero(totais > 0)
+        ordem = positivos[np.argsort(-totais[positivos], kind='stable')]
+        df_processado = df_processado.iloc[ordem].reset_index(drop=True)
         
-        # Ordenar por valor total
-        df_processado = df_processado.sort_values('TOTAL', ascending=False).reset_index(drop=True)
+        # Calcular percentuais (os totais já são todos positivos, então a soma
+        # é feita direto no NumPy, sem o tratamento de NaN do pandas)
+        totais = df_processado['TOTAL'].to_numpy(dtype=np.float64)
+        total_geral = np.add.reduce(totais)
+        incidencia = totais * (100.0 / total_geral)
+        acumulado = np.cumsum(incidencia)
         
-        # Calcular percentuais
-        total_geral = df_processado['TOTAL'].sum()
-        df_processado['INCIDÊNCIA DO ITEM (%)'] = (df_processado['TOTAL'] / total_geral * 100).round(2)
-        df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'] = df_processado['INCIDÊNCIA DO ITEM (%)'].cumsum().round(2)
+        # Arredondar apenas as colunas exibidas
+        df_processado['INCIDÊNCIA DO ITEM (%)'] = np.round(incidencia, 2)
+        df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'] = np.round(acumulado, 2)
         
-        # Classificar itens
-        df_processado['CLASSIFICAÇÃO'] = df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'].apply(
-            lambda x: 'A' if x <= 80 else ('B' if x <= 95 else 'C'))
+        # Classificar itens pelo acumulado sem arredondamento
+        df_processado['CLASSIFICAÇÃO'] = pd.Categorical.from_codes(
+            np.searchsorted(LIMITES_CLASSES, acumulado), categories=CLASSES)
         
         # Adicionar número do item e formatar total
         df_processado['NÚMERO DO ITEM'] = range(1, len(df_processado) + 1)
-        df_processado['TOTAL_FORMATADO'] = df_processado['TOTAL'].apply(formatar_moeda_real)
+        df_processado['TOTAL_FORMATADO'] = formatar_moeda_vetor(df_processado['TOTAL'].to_numpy())
         
-        return df_processado
+        # Cor de cada item no gráfico, calculada uma única vez a partir dos códigos da classe
+        df_processado['_COLOR'] = CORES_CLASSES[df_processado['CLASSIFICAÇÃO'].cat.codes.to_numpy()]
+        
+        # Descrições em minúsculas para a busca sem diferenciar maiúsculas,
+        # já no array de tamanho fixo usado pelo np.char.find
+        descricoes = df_processado['DESCRIÇÃO'].fillna('').astype(str).str.lower().to_numpy(dtype=str)
+        
+        return df_processado, descricoes
         
     except Exception as e:
         raise Exception(f"Erro ao processar dados: {str(e)}")
 
+@st.cache_data(show_spinner=False)
+def gerar_excel(df_processado):
+    """Gera o arquivo Excel com os dados processados"""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter', engine_kwargs={'options': {'in_memory': True}}) as writer:
+        df_processado.drop(columns=COLUNAS_INTERNAS).to_excel(writer, index=False, sheet_name='Dados Processados')
+    return buffer.getvalue()
+
 def main():
     st.title('Análise Curva ABC')
     
@@ -116,8 +162,8 @@ def main():
     if uploaded_file is not None:
         try:
             # Carregar e processar dados
-            df = carregar_dados(uploaded_file)
-            df_processado = processar_dados(df)
+            df = carregar_dados(uploaded_file.getvalue(), uploaded_file.name)
+            df_processado, descricoes = processar_dados(df)
             
             # Interface com abas
             tab1, tab2, tab3 = st.tabs(['Visão Geral', 'Análise Detalhada', 'Filtros'])
@@ -132,13 +178,13 @@ def main():
                     x=df_processado['NÚMERO DO ITEM'],
                     y=df_processado['INCIDÊNCIA DO ITEM (%)'],
                     name='Incidência',
-                    marker_color=df_processado['CLASSIFICAÇÃO'].map({'A': 'blue', 'B': 'orange', 'C': 'green'}),
+                    marker_color=df_processado['_COLOR'],
                     text=df_processado['ITEM'],
-                    customdata=np.column_stack((df_processado['TOTAL_FORMATADO'], df_processado['CLASSIFICAÇÃO']))
+                    customdata=df_processado[['TOTAL_FORMATADO', 'CLASSIFICAÇÃO']].to_numpy()
                 ))
                 
-                # Linha de acumulado
-                fig_pareto.add_trace(go.Scatter(
+                # Linha de acumulado em WebGL
+                fig_pareto.add_trace(go.Scattergl(
                     x=df_processado['NÚMERO DO ITEM'],
                     y=df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'],
                     name='Acumulado',
@@ -157,11 +203,12 @@ def main():
                         side='right'
                     ),
                     showlegend=True,
-                    height=600
+                    height=600,
+                    uirevision='keep'
                 )
                 
                 # Gráfico de Pizza
-                df_pizza = df_processado.groupby('CLASSIFICAÇÃO').agg({
+                df_pizza = df_processado.groupby('CLASSIFICAÇÃO', observed=True).agg({
                     'TOTAL': 'sum',
                     'ITEM': 'count'
                 }).reset_index()
@@ -184,7 +231,7 @@ def main():
                 
                 # Resumo
                 st.subheader('Resumo por Classe')
-                resumo = df_processado.groupby('CLASSIFICAÇÃO').agg({
+                resumo = df_processado.groupby('CLASSIFICAÇÃO', observed=True).agg({
                     'ITEM': 'count',
                     'TOTAL': ['sum', 'mean']
                 }).round(2)
@@ -193,7 +240,7 @@ def main():
             
             # Aba 2: Análise Detalhada
             with tab2:
-                st.dataframe(df_processado)
+                st.dataframe(df_processado.drop(columns=COLUNAS_INTERNAS))
             
             # Aba 3: Filtros
             with tab3:
@@ -201,8 +248,8 @@ def main():
                 with col1:
                     classes_selecionadas = st.multiselect(
                         'Filtrar por classe',
-                        ['A', 'B', 'C'],
-                        default=['A', 'B', 'C']
+                        CLASSES,
+                        default=CLASSES
                     )
                 
                 with col2:
@@ -218,29 +265,27 @@ def main():
                 busca = st.text_input('Buscar por descrição')
                 
                 # Aplicar filtros
+                totais = df_processado['TOTAL'].to_numpy()
                 mask = (
-                    (df_processado['CLASSIFICAÇÃO'].isin(classes_selecionadas)) &
-                    (df_processado['TOTAL'] >= valores[0]) &
-                    (df_processado['TOTAL'] <= valores[1])
+                    np.isin(df_processado['CLASSIFICAÇÃO'].to_numpy(), classes_selecionadas) &
+                    (totais >= valores[0]) &
+                    (totais <= valores[1])
                 )
                 
                 if busca:
-                    mask &= df_processado['DESCRIÇÃO'].str.contains(busca, case=False, na=False)
+                    mask &= np.char.find(descricoes, busca.lower()) >= 0
                 
                 df_filtrado = df_processado[mask]
-                st.dataframe(df_filtrado)
+                st.dataframe(df_filtrado.drop(columns=COLUNAS_INTERNAS))
             
-            # Botão de download
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                df_processado.to_excel(writer, index=False, sheet_name='Dados Processados')
-            
-            st.sidebar.download_button(
-                label="📥 Baixar Dados Processados (Excel)",
-                data=buffer.getvalue(),
-                file_name="curva_abc_processada.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            # Botão de download: o Excel só é gerado quando solicitado
+            if st.sidebar.button('📊 Gerar Excel'):
+                st.sidebar.download_button(
+                    label="📥 Baixar Dados Processados (Excel)",
+                    data=gerar_excel(df_processado),
+                    file_name="curva_abc_processada.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
             
         except Exception as e:
             st.error(f'Erro ao processar arquivo: {str(e)}')
@@ -3,11 +3,11 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import numpy as np
-import io
 from datetime import datetime
 from fpdf import FPDF
 import base64
 from io import BytesIO
+from matplotlib.figure import Figure
 
 # Configuração da página
 st.set_page_config(page_title="Análise Curva ABC", layout="wide")
@@ -19,6 +19,34 @@ TOOLTIPS = {
     'CLASSIFICAÇÃO': 'A: Items críticos (80% do valor)\nB: Items intermediários (15% do valor)\nC: Items menos críticos (5% do valor)'
 }
 
+# Classes ABC e cores usadas no gráfico de Pareto (mesma ordem)
+CLASSES = ['A', 'B', 'C']
+CORES_CLASSES = np.array(['blue', 'orange', 'green'])
+
+# Remove 'R$', espaços e separadores de milhar e troca a vírgula decimal por ponto
+TABELA_MOEDA = str.maketrans(',', '.', 'R$ .')
+
+# Troca os separadores do formato americano (1,234.56) pelos do brasileiro (1.234,56)
+TABELA_SEPARADORES = str.maketrans(',.', '.,')
+
+# Limites do percentual acumulado para as classes A (até 80%) e B (até 95%)
+LIMITES_CLASSES = [80, 95]
+
+# Colunas auxiliares que não são exibidas nem exportadas
+COLUNAS_INTERNAS = ['_COLOR', '_DESCRICAO_MINUSCULA']
+
+# Colunas usadas pelos gráficos, que compõem a chave do cache das figuras
+COLUNAS_CHAVE = ['ITEM', 'DESCRIÇÃO', 'TOTAL', 'CLASSIFICAÇÃO']
+
+# Número máximo de pontos enviados ao navegador para a linha de acumulado
+MAX_PONTOS_ACUMULADO = 1000
+
+# Tamanho máximo da descrição enviada no hover do gráfico de Pareto
+MAX_CARACTERES_DESCRICAO = 60
+
+# Linhas a serem descartadas (numeração original da planilha)
+LINHAS_PARA_DESCARTAR = frozenset([14, 15, 30, 59, 262])
+
 def limpar_valor_monetario(valor):
     """Converte uma string de valor monetário para float"""
     try:
@@ -26,7 +54,7 @@ def limpar_valor_monetario(valor):
             return 0.0
         if isinstance(valor, str):
             # Remove R$, espaços e converte para float
-            valor = valor.replace('R$', '').replace(' ', '').replace('.', '').replace(',', '.')
+            valor = valor.translate(TABELA_MOEDA)
         return float(valor)
     except:
         return 0.0
@@ -34,21 +62,23 @@ def limpar_valor_monetario(valor):
 def formatar_moeda_real(valor):
     """Formata um número para o formato de moeda brasileira"""
     try:
-        return f"R$ {valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+        return f"R$ {valor:,.2f}".translate(TABELA_SEPARADORES)
     except:
         return "R$ 0,00"
 
-def carregar_dados(uploaded_file):
-    """Carrega e prepara os dados da planilha, removendo linhas específicas"""
+def formatar_moeda_vetor(valores):
+    """Formata um array de números para o formato de moeda brasileira"""
+    return [f"R$ {valor:,.2f}".translate(TABELA_SEPARADORES) for valor in valores.tolist()]
+
+@st.cache_data(show_spinner=False)
+def carregar_dados(file_bytes, file_name):
+    """Carrega e prepara os dados da planilha, removendo linhas específicas (cacheado pelo conteúdo do arquivo)"""
     try:
-        # Lista de linhas a serem removidas (mantendo a referência original)
-        linhas_excluir = [14, 15, 30, 59, 262]
-        
-        file_extension = uploaded_file.name.split('.')[-1].lower()
+        file_extension = file_name.split('.')[-1].lower()
         
         if file_extension in ['xlsx', 'xlsm']:
-            # Primeiro, vamos ler todas as linhas para identificar corretamente as que precisamos remover
-            df_temp = pd.read_excel(uploaded_file, sheet_name='ARP', usecols='A:Q', header=None)
+            # Primeiro, vamos ler a coluna A para localizar o cabeçalho
+            df_temp = pd.read_excel(BytesIO(file_bytes), sheet_name='ARP', usecols='A', header=None, engine='calamine')
             
             # Encontrar o índice real da linha que contém os cabeçalhos (normalmente linha 11)
             header_index = None
@@ -60,20 +90,18 @@ def carregar_dados(uploaded_file):
             if header_index is None:
                 raise Exception("Não foi possível encontrar o cabeçalho da planilha")
             
-            # Agora vamos ler o arquivo novamente, mas pulando até o cabeçalho
+            # Agora vamos ler o arquivo novamente, pulando até o cabeçalho e
+            # descartando as linhas específicas já na leitura
             df = pd.read_excel(
-                uploaded_file,
+                BytesIO(file_bytes),
                 sheet_name='ARP',
                 usecols='A:Q',
-                header=header_index
+                skiprows=lambda i: i < header_index or (i > header_index and i + 1 in LINHAS_PARA_DESCARTAR),
+                engine='calamine'
             )
             
-            # Converter os números das linhas originais para índices do DataFrame
-            linhas_para_remover = [x - (header_index + 2) for x in linhas_excluir]
-            
         elif file_extension == 'csv':
-            df = pd.read_csv(uploaded_file)
-            linhas_para_remover = [x - 1 for x in linhas_excluir]
+            df = pd.read_csv(BytesIO(file_bytes), skiprows=lambda i: i in LINHAS_PARA_DESCARTAR)
         else:
             raise Exception("Formato de arquivo não suportado. Use .xlsx, .xlsm ou .csv")
         
@@ -84,9 +112,6 @@ def carregar_dados(uploaded_file):
             'MO C/ BDI', 'MAT C/ BDI', 'EQUIP C/ BDI2', 'TOTAL'
         ]
         
-        # Remover as linhas específicas
-        df = df.drop(linhas_para_remover, errors='ignore')
-        
         # Limpar e converter a coluna TOTAL
         df['TOTAL'] = df['TOTAL'].apply(limpar_valor_monetario)
         
@@ -105,36 +130,63 @@ def carregar_dados(uploaded_file):
     except Exception as e:
         raise Exception(f"Erro ao carregar arquivo: {str(e)}")
 
+def calcular_chave_dados(df_processado):
+    """Calcula uma chave barata e determinística que identifica os dados processados"""
+    hashes = pd.util.hash_pandas_object(df_processado[COLUNAS_CHAVE], index=False).to_numpy()
+    # Cada hash é multiplicado pela posição da linha (aritmética uint64, com estouro
+    # circular), para que a chave mude quando só a ordem das linhas mudar
+    posicoes = np.arange(1, len(hashes) + 1, dtype=np.uint64)
+    return int(np.add.reduce(hashes * posicoes))
+
+@st.cache_resource(show_spinner=False)
 def processar_dados(df):
-    """Processa os dados para análise ABC"""
+    """Processa os dados para análise ABC
+    
+    Retorna o DataFrame processado e a chave que o identifica, calculada uma
+    única vez junto com ele. O resultado fica em cache sem ser copiado a cada
+    execução do script, por isso deve ser tratado como somente leitura.
+    """
     try:
         # Verificar se há dados válidos
         if df.empty:
             raise Exception("DataFrame está vazio")
             
-        # Criar cópia do DataFrame
-        df_processado = df.copy()
+        # O st.cache_data de carregar_dados já entrega uma cópia, não é preciso copiá-lo
+        df_processado = df
         
         # Ordenar por valor total
-        df_processado = df_processado.sort_values('TOTAL', ascending=False).reset_index(drop=True)
+        ordem = np.argsort(-df_processado['TOTAL'].to_numpy(), kind='stable')
+        df_processado = df_processado.iloc[ordem].reset_index(drop=True)
         
-        # Calcular percentuais
-        total_geral = df_processado['TOTAL'].sum()
+        # Calcular percentuais (carregar_dados já descartou os totais nulos,
+        # então a soma é feita direto no NumPy, sem o tratamento de NaN do pandas)
+        totais = df_processado['TOTAL'].to_numpy(dtype=np.float64)
+        total_geral = np.add.reduce(totais)
         if total_geral <= 0:
             raise Exception("Soma total dos valores é zero ou negativa")
             
-        df_processado['INCIDÊNCIA DO ITEM (%)'] = (df_processado['TOTAL'] / total_geral * 100).round(2)
-        df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'] = df_processado['INCIDÊNCIA DO ITEM (%)'].cumsum().round(2)
+        incidencia = totais * (100.0 / total_geral)
+        acumulado = np.cumsum(incidencia)
         
-        # Classificar itens
-        df_processado['CLASSIFICAÇÃO'] = df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'].apply(
-            lambda x: 'A' if x <= 80 else ('B' if x <= 95 else 'C'))
+        # Arredondar apenas as colunas exibidas
+        df_processado['INCIDÊNCIA DO ITEM (%)'] = np.round(incidencia, 2)
+        df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'] = np.round(acumulado, 2)
+        
+        # Classificar itens pelo acumulado sem arredondamento
+        df_processado['CLASSIFICAÇÃO'] = pd.Categorical.from_codes(
+            np.searchsorted(LIMITES_CLASSES, acumulado), categories=CLASSES)
         
         # Adicionar número do item e formatar total
         df_processado['NÚMERO DO ITEM'] = range(1, len(df_processado) + 1)
-        df_processado['TOTAL_FORMATADO'] = df_processado['TOTAL'].apply(formatar_moeda_real)
+        df_processado['TOTAL_FORMATADO'] = formatar_moeda_vetor(df_processado['TOTAL'].to_numpy())
+        
+        # Cor de cada item no gráfico, calculada uma única vez a partir dos códigos da classe
+        df_processado['_COLOR'] = CORES_CLASSES[df_processado['CLASSIFICAÇÃO'].cat.codes.to_numpy()]
         
-        return df_processado
+        # Descrições em minúsculas para a busca sem diferenciar maiúsculas
+        df_processado['_DESCRICAO_MINUSCULA'] = df_processado['DESCRIÇÃO'].fillna('').astype(str).str.lower()
+        
+        return df_processado, calcular_chave_dados(df_processado)
         
     except Exception as e:
         raise Exception(f"Erro ao processar dados: {str(e)}")
@@ -172,7 +224,194 @@ def criar_guia_uso():
     """
     return guia
 
-def gerar_pdf(df_processado, fig_pareto, fig_pizza, resumo):
+def amostrar_indices(n, max_pontos):
+    """Retorna até max_pontos índices igualmente espaçados em [0, n), incluindo o primeiro e o último"""
+    if n <= max_pontos:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_pontos).astype(int))
+
+@st.cache_resource(show_spinner=False)
+def criar_grafico_pareto(chave_dados, _df_processado):
+    """Cria o gráfico de Pareto, reaproveitado enquanto a chave dos dados não mudar"""
+    df_processado = _df_processado
+    fig_pareto = go.Figure()
+    
+    fig_pareto.add_trace(go.Bar(
+        x=df_processado['NÚMERO DO ITEM'],
+        y=df_processado['INCIDÊNCIA DO ITEM (%)'],
+        name='Incidência',
+        marker_color=df_processado['_COLOR'],
+        text=df_processado['ITEM'],
+        # Descrição truncada para reduzir o volume enviado ao navegador; a
+        # descrição completa continua nas tabelas
+        customdata=df_processado[['TOTAL_FORMATADO', 'CLASSIFICAÇÃO']].assign(**{
+            'DESCRIÇÃO': df_processado['DESCRIÇÃO'].str.slice(0, MAX_CARACTERES_DESCRICAO)
+        }).to_numpy(),
+        hovertemplate="""
+        <b>Item:</b> %{text}<br>
+        <b>Descrição:</b> %{customdata[2]}<br>
+        <b>Valor:</b> %{customdata[0]}<br>
+        <b>Classe:</b> %{customdata[1]}<br>
+        <b>Incidência:</b> %{y:.2f}%
+        <extra></extra>
+        """
+    ))
+    
+    # Linha de acumulado em WebGL; por ser monotônica, pode ser amostrada
+    # sem perda visual quando há muitos itens
+    indices = amostrar_indices(len(df_processado), MAX_PONTOS_ACUMULADO)
+    fig_pareto.add_trace(go.Scattergl(
+        x=df_processado['NÚMERO DO ITEM'].to_numpy()[indices],
+        y=df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'].to_numpy()[indices],
+        name='Acumulado',
+        line=dict(color='red', width=2),
+        yaxis='y2',
+        hovertemplate="<b>Acumulado:</b> %{y:.2f}%<extra></extra>"
+    ))
+    
+    fig_pareto.update_layout(
+        title='Curva ABC (Pareto)',
+        xaxis_title='Número do Item',
+        yaxis_title='Incidência Individual (%)',
+        yaxis2=dict(
+            title='Incidência Acumulada (%)',
+            overlaying='y',
+            side='right'
+        ),
+        showlegend=True,
+        height=600,
+        hovermode='x unified',
+        uirevision='keep'
+    )
+    
+    return fig_pareto
+
+@st.cache_resource(show_spinner=False)
+def preparar_descricoes(chave_dados, _df_processado):
+    """Monta uma única vez o array de descrições em minúsculas usado pela busca"""
+    return _df_processado['_DESCRICAO_MINUSCULA'].to_numpy(dtype=str)
+
+def buscar_descricao(chave_dados, descricoes, busca):
+    """Retorna a máscara das descrições que contêm a busca, sem diferenciar maiúsculas
+    
+    Enquanto o usuário digita, cada busca costuma conter a anterior; nesse caso
+    só as descrições que já atendiam à busca anterior precisam ser verificadas.
+    """
+    busca = busca.lower()
+    anterior = st.session_state.get('busca_anterior')
+    if anterior is not None and anterior[0] == chave_dados and anterior[1] in busca:
+        candidatos = np.flatnonzero(anterior[2])
+    else:
+        candidatos = np.arange(len(descricoes))
+    
+    mask = np.zeros(len(descricoes), dtype=bool)
+    mask[candidatos] = np.char.find(descricoes[candidatos], busca) >= 0
+    st.session_state['busca_anterior'] = (chave_dados, busca, mask)
+    return mask
+
+def resumir_por_classe(df_processado):
+    """Calcula quantidade, valor total e valor médio de cada classe em um único groupby"""
+    return df_processado.groupby('CLASSIFICAÇÃO', observed=True).agg(**{
+        'Quantidade de Itens': ('ITEM', 'count'),
+        'Valor Total': ('TOTAL', 'sum'),
+        'Valor Médio': ('TOTAL', 'mean')
+    })
+
+@st.cache_resource(show_spinner=False)
+def criar_grafico_pizza(chave_dados, _resumo_classes):
+    """Cria o gráfico de pizza por classe, reaproveitado enquanto a chave dos dados não mudar"""
+    df_pizza = _resumo_classes.reset_index().rename(
+        columns={'Valor Total': 'TOTAL', 'Quantidade de Itens': 'ITEM'})
+    
+    df_pizza['Percentual'] = (df_pizza['TOTAL'] / df_pizza['TOTAL'].sum() * 100).round(2)
+    
+    fig_pizza = px.pie(
+        df_pizza,
+        values='TOTAL',
+        names='CLASSIFICAÇÃO',
+        title='Distribuição por Classe',
+        hover_data=['Percentual'],
+        custom_data=['ITEM']
+    )
+    
+    fig_pizza.update_traces(
+        hovertemplate="<b>Classe:</b> %{label}<br>" +
+        "<b>Valor Total:</b> R$ %{value:,.2f}<br>" +
+        "<b>Percentual:</b> %{customdata[0]:.1f}%<br>" +
+        "<b>Quantidade de Itens:</b> %{customdata[1]}<extra></extra>"
+    )
+    
+    return fig_pizza
+
+@st.cache_data(show_spinner=False)
+def renderizar_graficos_png(chave_dados, _fig_pareto, _fig_pizza):
+    """Renderiza os gráficos de Pareto e Pizza em PNG (cacheado pela chave dos dados)"""
+    # O Kaleido atende uma renderização por vez, então as duas são feitas em sequência
+    pareto_png = _fig_pareto.to_image(format='png')
+    pizza_png = _fig_pizza.to_image(format='png')
+    return pareto_png, pizza_png
+
+@st.cache_data(show_spinner=False)
+def gerar_excel(df_processado, pareto_png, pizza_png):
+    """Gera a planilha Excel com os dados processados e os gráficos"""
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter', engine_kwargs={'options': {'in_memory': True}}) as writer:
+        # Dados processados
+        df_processado.drop(columns=COLUNAS_INTERNAS).to_excel(writer, sheet_name='Dados Processados', index=False)
+        
+        # Inserir imagens na planilha
+        worksheet = writer.sheets['Dados Processados']
+        worksheet.insert_image('A1', 'pareto.png', {'image_data': BytesIO(pareto_png)})
+        worksheet.insert_image('J1', 'pizza.png', {'image_data': BytesIO(pizza_png)})
+    
+    return buffer.getvalue()
+
+def renderizar_pareto_pdf(df_processado):
+    """Renderiza o gráfico de Pareto em PNG com matplotlib, para o relatório PDF"""
+    fig = Figure(figsize=(8, 4))
+    ax_incidencia = fig.subplots()
+    ax_incidencia.bar(
+        df_processado['NÚMERO DO ITEM'],
+        df_processado['INCIDÊNCIA DO ITEM (%)'],
+        color=df_processado['_COLOR']
+    )
+    ax_incidencia.set_xlabel('Número do Item')
+    ax_incidencia.set_ylabel('Incidência Individual (%)')
+    
+    ax_acumulado = ax_incidencia.twinx()
+    ax_acumulado.plot(
+        df_processado['NÚMERO DO ITEM'],
+        df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'],
+        color='red',
+        linewidth=2
+    )
+    ax_acumulado.set_ylabel('Incidência Acumulada (%)')
+    
+    ax_incidencia.set_title('Curva ABC (Pareto)')
+    fig.tight_layout()
+    
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    return buffer.getvalue()
+
+def renderizar_pizza_pdf(resumo_classes):
+    """Renderiza o gráfico de pizza por classe em PNG com matplotlib, para o relatório PDF"""
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    ax.pie(
+        resumo_classes['Valor Total'],
+        labels=resumo_classes.index.astype(str),
+        colors=CORES_CLASSES[resumo_classes.index.codes],
+        autopct='%1.1f%%'
+    )
+    ax.set_title('Distribuição por Classe')
+    fig.tight_layout()
+    
+    buffer = BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    return buffer.getvalue()
+
+def gerar_pdf(df_processado, resumo_classes, resumo):
     """Gera relatório PDF com análises"""
     class PDF(FPDF):
         def header(self):
@@ -185,6 +424,10 @@ def gerar_pdf(df_processado, fig_pareto, fig_pizza, resumo):
             self.set_font('Arial', 'I', 8)
             self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
 
+    # Gráficos estáticos desenhados no próprio processo, sem o Kaleido
+    pareto_png = renderizar_pareto_pdf(df_processado)
+    pizza_png = renderizar_pizza_pdf(resumo_classes)
+    
     pdf = PDF()
     pdf.add_page()
     
@@ -205,18 +448,14 @@ def gerar_pdf(df_processado, fig_pareto, fig_pizza, resumo):
     pdf.set_font('Arial', 'B', 12)
     pdf.cell(0, 10, 'Análise de Pareto', 0, 1)
     
-    pareto_img = BytesIO()
-    fig_pareto.write_image(pareto_img, format='png', width=800, height=400)
-    pdf.image(pareto_img, x=10, y=30, w=190)
+    pdf.image(BytesIO(pareto_png), x=10, y=30, w=190)
     
     # Gráfico de Pizza
     pdf.add_page()
     pdf.set_font('Arial', 'B', 12)
     pdf.cell(0, 10, 'Distribuição por Classe', 0, 1)
     
-    pizza_img = BytesIO()
-    fig_pizza.write_image(pizza_img, format='png', width=800, height=400)
-    pdf.image(pizza_img, x=10, y=30, w=190)
+    pdf.image(BytesIO(pizza_png), x=10, y=30, w=190)
     
     # Resumo em tabela
     pdf.add_page()
@@ -226,19 +465,15 @@ def gerar_pdf(df_processado, fig_pareto, fig_pizza, resumo):
     # Cabeçalho da tabela
     col_width = 47
     pdf.set_font('Arial', 'B', 10)
-    pdf.cell(col_width, 10, 'Classe', 1)
-    pdf.cell(col_width, 10, 'Qtd Itens', 1)
-    pdf.cell(col_width, 10, 'Valor Total', 1)
-    pdf.cell(col_width, 10, 'Valor Médio', 1)
+    for titulo in ['Classe', 'Qtd Itens', 'Valor Total', 'Valor Médio']:
+        pdf.cell(col_width, 10, titulo, 1)
     pdf.ln()
     
-    # Dados da tabela
+    # Dados da tabela (convertidos para texto de uma vez, sem iterrows)
     pdf.set_font('Arial', '', 10)
-    for idx, row in resumo.iterrows():
-        pdf.cell(col_width, 10, str(idx), 1)
-        pdf.cell(col_width, 10, str(row['Quantidade de Itens']), 1)
-        pdf.cell(col_width, 10, str(row['Valor Total']), 1)
-        pdf.cell(col_width, 10, str(row['Valor Médio']), 1)
+    for linha in resumo.reset_index().astype(str).itertuples(index=False):
+        for texto in linha:
+            pdf.cell(col_width, 10, texto, 1)
         pdf.ln()
     
     # Recomendações
@@ -248,7 +483,7 @@ def gerar_pdf(df_processado, fig_pareto, fig_pizza, resumo):
     pdf.set_font('Arial', '', 10)
     
     recomendacoes = [
-        f"1. Foco em itens classe A: Priorizar a gestão dos {len(df_processado[df_processado['CLASSIFICAÇÃO']=='A'])} itens que representam 80% do valor total.",
+        f"1. Foco em itens classe A: Priorizar a gestão dos {resumo['Quantidade de Itens'].get('A', 0)} itens que representam 80% do valor total.",
         "2. Revisão periódica: Estabelecer ciclos de revisão trimestral para itens classe A.",
         "3. Otimização de estoques: Adequar políticas de estoque de acordo com a classificação."
     ]
@@ -273,102 +508,27 @@ def main():
     
     if uploaded_file is not None:
         try:
-            df = carregar_dados(uploaded_file)
-            df_processado = processar_dados(df)
+            df = carregar_dados(uploaded_file.getvalue(), uploaded_file.name)
+            df_processado, chave_dados = processar_dados(df)
+            resumo_classes = resumir_por_classe(df_processado)
             
             tab1, tab2, tab3, tab4 = st.tabs(['Visão Geral', 'Análise Detalhada', 'Filtros', 'Relatório'])
             
             # Aba 1: Visão Geral
             with tab1:
-                # Gráfico de Pareto
-                fig_pareto = go.Figure()
-                
-                fig_pareto.add_trace(go.Bar(
-                    x=df_processado['NÚMERO DO ITEM'],
-                    y=df_processado['INCIDÊNCIA DO ITEM (%)'],
-                    name='Incidência',
-                    marker_color=df_processado['CLASSIFICAÇÃO'].map({'A': 'blue', 'B': 'orange', 'C': 'green'}),
-                    text=df_processado['ITEM'],
-                    customdata=np.column_stack((
-                        df_processado['TOTAL_FORMATADO'],
-                        df_processado['CLASSIFICAÇÃO'],
-                        df_processado['DESCRIÇÃO']
-                    )),
-                    hovertemplate="""
-                    <b>Item:</b> %{text}<br>
-                    <b>Descrição:</b> %{customdata[2]}<br>
-                    <b>Valor:</b> %{customdata[0]}<br>
-                    <b>Classe:</b> %{customdata[1]}<br>
-                    <b>Incidência:</b> %{y:.2f}%
-                    <extra></extra>
-                    """
-                ))
-                
-                fig_pareto.add_trace(go.Scatter(
-    x=df_processado['NÚMERO DO ITEM'],
-    y=df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'],
-    name='Acumulado',
-    line=dict(color='red', width=2),
-    yaxis='y2',
-    hovertemplate="<b>Acumulado:</b> %{y:.2f}%<extra></extra>"
-))
-
-                fig_pareto.add_trace(go.Scatter(
-                    x=df_processado['NÚMERO DO ITEM'],
-                    y=df_processado['INCIDÊNCIA DO ITEM (%) ACUMULADO'],
-                    name='Acumulado',
-                    line=dict(color='red', width=2),
-                    yaxis='y2',
-                    hovertemplate="<b>Acumulado:</b> %{y:.2f}%<extra></extra>"
-                ))
-                
-                fig_pareto.update_layout(
-                    title='Curva ABC (Pareto)',
-                    xaxis_title='Número do Item',
-                    yaxis_title='Incidência Individual (%)',
-                    yaxis2=dict(
-                        title='Incidência Acumulada (%)',
-                        overlaying='y',
-                        side='right'
-                    ),
-                    showlegend=True,
-                    height=600,
-                    hovermode='x unified'
-                )
-                
-                df_pizza = df_processado.groupby('CLASSIFICAÇÃO').agg({
-                    'TOTAL': 'sum',
-                    'ITEM': 'count'
-                }).reset_index()
-                
-                df_pizza['Percentual'] = (df_pizza['TOTAL'] / df_pizza['TOTAL'].sum() * 100).round(2)
-                
-                fig_pizza = px.pie(
-                    df_pizza,
-                    values='TOTAL',
-                    names='CLASSIFICAÇÃO',
-                    title='Distribuição por Classe',
-                    hover_data=['Percentual'],
-                    custom_data=['ITEM']
-                )
-                
-                fig_pizza.update_traces(
-                    hovertemplate="<b>Classe:</b> %{label}<br>" +
-                    "<b>Valor Total:</b> R$ %{value:,.2f}<br>" +
-                    "<b>Percentual:</b> %{customdata[0]:.1f}%<br>" +
-                    "<b>Quantidade de Itens:</b> %{customdata[1]}<extra></extra>"
-                )
+                # Gráficos cacheados pela chave dos dados processados
+                fig_pareto = criar_grafico_pareto(chave_dados, df_processado)
+                fig_pizza = criar_grafico_pizza(chave_dados, resumo_classes)
                 
                 col1, col2 = st.columns([2, 1])
                 with col1:
                     st.plotly_chart(fig_pareto, use_container_width=True)
                     # Botão para download do gráfico Pareto
                     if st.button('📥 Download Gráfico Pareto'):
-                        buffer = BytesIO()
-                        fig_pareto.write_image(buffer, format='png')
+                        pareto_png, _ = renderizar_graficos_png(chave_dados, fig_pareto, fig_pizza)
                         st.download_button(
                             label="💾 Salvar Gráfico Pareto",
-                            data=buffer.getvalue(),
+                            data=pareto_png,
                             file_name="pareto.png",
                             mime="image/png"
                         )
@@ -377,31 +537,26 @@ def main():
                     st.plotly_chart(fig_pizza, use_container_width=True)
                     # Botão para download do gráfico Pizza
                     if st.button('📥 Download Gráfico Pizza'):
-                        buffer = BytesIO()
-                        fig_pizza.write_image(buffer, format='png')
+                        _, pizza_png = renderizar_graficos_png(chave_dados, fig_pareto, fig_pizza)
                         st.download_button(
                             label="💾 Salvar Gráfico Pizza",
-                            data=buffer.getvalue(),
+                            data=pizza_png,
                             file_name="pizza.png",
                             mime="image/png"
                         )
                 
                 st.subheader('Resumo por Classe')
-                resumo = df_processado.groupby('CLASSIFICAÇÃO').agg({
-                    'ITEM': 'count',
-                    'TOTAL': ['sum', 'mean']
-                }).round(2)
-                resumo.columns = ['Quantidade de Itens', 'Valor Total', 'Valor Médio']
+                resumo = resumo_classes.round(2)
                 
                 # Formatar valores monetários no resumo
-                resumo['Valor Total'] = resumo['Valor Total'].apply(formatar_moeda_real)
-                resumo['Valor Médio'] = resumo['Valor Médio'].apply(formatar_moeda_real)
+                resumo['Valor Total'] = formatar_moeda_vetor(resumo['Valor Total'].to_numpy())
+                resumo['Valor Médio'] = formatar_moeda_vetor(resumo['Valor Médio'].to_numpy())
                 
                 st.dataframe(resumo)
             
             # Aba 2: Análise Detalhada
             with tab2:
-                st.dataframe(df_processado)
+                st.dataframe(df_processado.drop(columns=COLUNAS_INTERNAS))
             
             # Aba 3: Filtros
             with tab3:
@@ -409,8 +564,8 @@ def main():
                 with col1:
                    classes_selecionadas = st.multiselect(
                         'Filtrar por classe',
-                        ['A', 'B', 'C'],
-                        default=['A', 'B', 'C'],
+                        CLASSES,
+                        default=CLASSES,
                         help=TOOLTIPS['CLASSIFICAÇÃO']
                     )
                 
@@ -428,17 +583,19 @@ def main():
                 busca = st.text_input('Buscar por descrição')
                 
                 # Aplicar filtros
+                totais = df_processado['TOTAL'].to_numpy()
                 mask = (
-                    (df_processado['CLASSIFICAÇÃO'].isin(classes_selecionadas)) &
-                    (df_processado['TOTAL'] >= valores[0]) &
-                    (df_processado['TOTAL'] <= valores[1])
+                    np.isin(df_processado['CLASSIFICAÇÃO'].to_numpy(), classes_selecionadas) &
+                    (totais >= valores[0]) &
+                    (totais <= valores[1])
                 )
                 
                 if busca:
-                    mask &= df_processado['DESCRIÇÃO'].str.contains(busca, case=False, na=False)
+                    descricoes = preparar_descricoes(chave_dados, df_processado)
+                    mask &= buscar_descricao(chave_dados, descricoes, busca)
                 
                 df_filtrado = df_processado[mask]
-                st.dataframe(df_filtrado)
+                st.dataframe(df_filtrado.drop(columns=COLUNAS_INTERNAS))
 
             # Aba 4: Relatório
             with tab4:
@@ -460,15 +617,15 @@ def main():
                 
                 # Análise por Classe
                 st.markdown('### Análise por Classe')
-                for classe in ['A', 'B', 'C']:
-                    df_classe = df_processado[df_processado['CLASSIFICAÇÃO'] == classe]
+                resumo_todas = resumo_classes.reindex(CLASSES, fill_value=0)
+                for classe in CLASSES:
                     st.markdown(f'**Classe {classe}**')
                     col1, col2, col3 = st.columns(3)
                     with col1:
                         st.metric(f'Itens Classe {classe}', 
-                                len(df_classe))
+                                int(resumo_todas.at[classe, 'Quantidade de Itens']))
                     with col2:
-                        valor_classe = df_classe['TOTAL'].sum()
+                        valor_classe = resumo_todas.at[classe, 'Valor Total']
                         st.metric(f'Valor Classe {classe}', 
                                 formatar_moeda_real(valor_classe))
                     with col3:
@@ -499,8 +656,7 @@ def main():
                 if st.button('📄 Gerar Relatório PDF'):
                     pdf_buffer = gerar_pdf(
                         df_processado, 
-                        fig_pareto, 
-                        fig_pizza, 
+                        resumo_classes, 
                         resumo
                     )
                     st.download_button(
@@ -510,35 +666,17 @@ def main():
                         mime="application/pdf"
                     )
             
-            # Botão de download do Excel com gráficos
-            buffer = io.BytesIO()
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                # Dados processados
-                df_processado.to_excel(writer, sheet_name='Dados Processados', index=False)
-                
-                # Adicionar gráficos
-                workbook = writer.book
-                worksheet = writer.sheets['Dados Processados']
-                
-                # Salvar gráficos como imagens temporárias
-                pareto_img = BytesIO()
-                fig_pareto.write_image(pareto_img)
-                
-                pizza_img = BytesIO()
-                fig_pizza.write_image(pizza_img)
+            # Botão de download do Excel com gráficos (gerado só quando solicitado)
+            if st.sidebar.button('📊 Gerar Excel com Gráficos'):
+                pareto_png, pizza_png = renderizar_graficos_png(chave_dados, fig_pareto, fig_pizza)
+                excel_bytes = gerar_excel(df_processado, pareto_png, pizza_png)
                 
-                # Inserir imagens na planilha
-                worksheet.insert_image('A1', 'pareto.png', 
-                                     {'image_data': pareto_img})
-                worksheet.insert_image('J1', 'pizza.png', 
-                                     {'image_data': pizza_img})
-            
-            st.sidebar.download_button(
-                label="📥 Baixar Dados e Gráficos (Excel)",
-                data=buffer.getvalue(),
-                file_name=f"curva_abc_completa_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+                st.sidebar.download_button(
+                    label="📥 Baixar Dados e Gráficos (Excel)",
+                    data=excel_bytes,
+                    file_name=f"curva_abc_completa_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
             
         except Exception as e:
             st.error(f'Erro ao processar arquivo: {str(e)}')
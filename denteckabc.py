@@ -1,34 +1,95 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+import numpy as np
 import io
 
+# Remove 'R$', espaços e separadores de milhar e troca a vírgula decimal por ponto
+TABELA_MOEDA = str.maketrans(',', '.', 'R$ .')
+
+# Posição da coluna TOTAL na aba CURVA ABC (coluna G)
+COLUNA_TOTAL = 6
+
+# Classes ABC, na ordem dos limites abaixo
+CLASSES = ['A', 'B', 'C']
+
+# Limites do percentual acumulado para as classes A (até 80%) e B (até 95%)
+LIMITES_CLASSES = [80, 95]
+
+# Quantidade de linhas exibidas na prévia (a planilha completa vai no download)
+MAX_LINHAS_PREVIA = 200
+
+def converter_moeda(valor):
+    """Converte um valor no formato 'R$ 1.234,56' para float (NaN se não for moeda)"""
+    # Células já numéricas (valores formatados como moeda no Excel) não precisam de limpeza
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    try:
+        return float(valor.translate(TABELA_MOEDA))
+    except (AttributeError, ValueError):
+        return np.nan
+
+@st.cache_data(show_spinner=False)
+def carregar_dados(file_bytes):
+    """Lê a aba CURVA ABC da planilha (cacheado pelo conteúdo do arquivo)
+    
+    Se a aba não tiver a coluna TOTAL, retorna só o cabeçalho, para que as
+    colunas disponíveis possam ser mostradas.
+    """
+    # Ler só o cabeçalho para conferir se a coluna TOTAL existe antes de montar o conversor
+    cabecalho = pd.read_excel(io.BytesIO(file_bytes), sheet_name='CURVA ABC', engine='calamine', nrows=0)
+    if len(cabecalho.columns) <= COLUNA_TOTAL:
+        return cabecalho
+    
+    # criar_curva_abc só usa as 310 primeiras linhas de dados, então o resto não é lido;
+    # a coluna TOTAL já é convertida para float durante a leitura
+    return pd.read_excel(
+        io.BytesIO(file_bytes),
+        sheet_name='CURVA ABC',
+        engine='calamine',
+        nrows=310,
+        converters={COLUNA_TOTAL: converter_moeda},
+    )
+
+@st.cache_data(show_spinner=False)
 def criar_curva_abc(df):
-    # Selecionar apenas as linhas 12 a 310
-    df = df.iloc[11:310].copy()
+    # Selecionar apenas as linhas 12 a 310 (sem cópia: as colunas novas
+    # são inseridas só no DataFrame final)
+    df = df.iloc[11:310]
     
-    # Acessar a coluna TOTAL diretamente pela posição (coluna G = índice 6)
-    df['TOTAL'] = df.iloc[:, 6].str.replace('R$ ', '').str.replace('.', '').str.replace(',', '.').astype(float)
+    # Acessar a coluna TOTAL (já convertida na leitura) diretamente pela posição
+    valores = df.iloc[:, COLUNA_TOTAL].to_numpy(dtype=np.float64)
     
     # Ordenar por valor total em ordem decrescente
-    df = df.sort_values('TOTAL', ascending=False)
+    ordem = np.argsort(-valores, kind='stable')
+    valores = valores[ordem]
     
-    # Calcular percentuais
-    total_geral = df['TOTAL'].sum()
-    df['INCIDÊNCIA DO ITEM (%)'] = (df['TOTAL'] / total_geral) * 100
-    df['INCIDÊNCIA ACUMULADA (%)'] = df['INCIDÊNCIA DO ITEM (%)'].cumsum()
+    # Calcular percentuais com um único fator de escala e uma única soma acumulada
+    # (nansum porque células que não são moeda viram NaN)
+    escala = 100.0 / np.nansum(valores)
+    incidencia = valores * escala
+    acumulado = np.cumsum(valores) * escala
     
-    # Classificar
-    def get_classe(acumulado):
-        if acumulado <= 80:
-            return 'A'
-        elif acumulado <= 95:
-            return 'B'
-        else:
-            return 'C'
+    # Classificar pela busca binária dos limites de 80% e 95%, guardando a
+    # classe como categoria (códigos int8 em vez de strings)
+    classificacao = pd.Categorical.from_codes(
+        np.searchsorted(LIMITES_CLASSES, acumulado), categories=CLASSES)
     
-    df['CLASSIFICAÇÃO'] = df['INCIDÊNCIA ACUMULADA (%)'].apply(get_classe)
-    return df
+    # Reordenar e inserir as colunas calculadas de uma só vez
+    return df.iloc[ordem].assign(**{
+        'TOTAL': valores,
+        'INCIDÊNCIA DO ITEM (%)': incidencia,
+        'INCIDÊNCIA ACUMULADA (%)': acumulado,
+        'CLASSIFICAÇÃO': classificacao,
+    })
+
+@st.cache_data(show_spinner=False)
+def gerar_excel(df_classificado):
+    """Gera o arquivo Excel da curva ABC classificada"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter', engine_kwargs={'options': {'in_memory': True}}) as writer:
+        df_classificado.to_excel(writer, sheet_name='CURVA ABC', index=False)
+    return output.getvalue()
 
 def main():
     st.title('Análise Curva ABC')
@@ -38,18 +99,27 @@ def main():
     if uploaded_file is not None:
         try:
             # Ler arquivo especificando a aba correta
-            df = pd.read_excel(uploaded_file, sheet_name='CURVA ABC')
+            df = carregar_dados(uploaded_file.getvalue())
+            
+            # Verificar se a coluna TOTAL existe (a lista de colunas só é
+            # montada no caso de erro)
+            colunas = df.columns
+            if len(colunas) <= COLUNA_TOTAL:
+                st.error('A aba CURVA ABC não tem a coluna TOTAL (coluna G). Colunas disponíveis:')
+                st.write(list(colunas))
+                return
             
             # Processar dados
             df_classificado = criar_curva_abc(df)
             
             st.subheader('Dados Classificados')
-            st.dataframe(df_classificado)
+            st.dataframe(df_classificado.head(MAX_LINHAS_PREVIA), use_container_width=True)
+            st.write(df_classificado['CLASSIFICAÇÃO'].value_counts())
             
             # Criar gráfico da curva ABC
             fig = go.Figure()
-            fig.add_trace(go.Scatter(
-                x=list(range(len(df_classificado))),
+            fig.add_trace(go.Scattergl(
+                x=np.arange(len(df_classificado), dtype=np.int32),
                 y=df_classificado['INCIDÊNCIA ACUMULADA (%)'],
                 mode='lines+markers',
                 name='Curva ABC'
@@ -63,17 +133,15 @@ def main():
             
             st.plotly_chart(fig)
             
-            # Download dos resultados classificados
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df_classificado.to_excel(writer, sheet_name='CURVA ABC', index=False)
-            
-            st.download_button(
-                label="Baixar Curva ABC",
-                data=output.getvalue(),
-                file_name="curva_abc_classificada.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            # Download dos resultados classificados: o Excel só é gerado quando
+            # solicitado, e não a cada interação com a página
+            if st.button('Gerar Excel'):
+                st.download_button(
+                    label="Baixar Curva ABC",
+                    data=gerar_excel(df_classificado),
+                    file_name="curva_abc_classificada.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
             
         except Exception as e:
             st.error(f'Erro ao processar arquivo: {str(e)}')